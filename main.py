@@ -42,14 +42,15 @@ def main():
         )
 
         # Ejecutar pipeline completo
-        ruta_final = pipeline.ejecutar_pipeline_completo()
+        ruta_final, reporte = pipeline.ejecutar_pipeline_completo()
 
         # Mostrar resultados
         print(f"\n{'=' * 60}")
         print("✅ PROCESAMIENTO COMPLETADO EXITOSAMENTE")
         print(f"{'=' * 60}")
         print(f"📄 Archivo final guardado en: {ruta_final}")
-
+        print(f"📊 Registros: {reporte['total_registros']} | Columnas: {reporte['total_columnas']}")
+        print(f"🧮 Completitud: {reporte['porcentaje_completitud']}%")
 
         # Verificar que el archivo final existe
         if os.path.exists(ruta_final):
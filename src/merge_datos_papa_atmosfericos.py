@@ -4,7 +4,7 @@ Clase para fusionar datos de papa con datos atmosféricos.
 
 import pandas as pd
 import os
-from typing import Dict
+from typing import Dict, Optional
 import logging
 
 
@@ -13,27 +13,49 @@ class MergeDatosPapaAtmosfericos:
     Fusiona datasets de papa y datos atmosféricos.
     """
 
-    def __init__(self, ruta_clima: str, ruta_papa: str):
+    def __init__(self,
+                 ruta_clima: Optional[str] = None,
+                 ruta_papa: Optional[str] = None,
+                 df_clima: Optional[pd.DataFrame] = None,
+                 df_papa: Optional[pd.DataFrame] = None):
         """
-        Inicializa el fusionador con las rutas de los archivos.
+        Inicializa el fusionador con las rutas de los archivos o con DataFrames en memoria.
 
         Args:
-            ruta_clima (str): Ruta del archivo de datos climáticos
-            ruta_papa (str): Ruta del archivo de datos de papa
+            ruta_clima (str, optional): Ruta del archivo de datos climáticos
+            ruta_papa (str, optional): Ruta del archivo de datos de papa
+            df_clima (pd.DataFrame, optional): Datos climáticos ya cargados (sustituye a ruta_clima)
+            df_papa (pd.DataFrame, optional): Datos de papa ya cargados (sustituye a ruta_papa)
 
         Raises:
-            FileNotFoundError: Si algún archivo no existe
+            FileNotFoundError: Si falta un DataFrame y su archivo no existe
         """
-        if not os.path.exists(ruta_clima):
+        if df_clima is None and (ruta_clima is None or not os.path.exists(ruta_clima)):
             raise FileNotFoundError(f"El archivo de datos climáticos {ruta_clima} no existe")
 
-        if not os.path.exists(ruta_papa):
+        if df_papa is None and (ruta_papa is None or not os.path.exists(ruta_papa)):
             raise FileNotFoundError(f"El archivo de datos de papa {ruta_papa} no existe")
 
         self.ruta_clima = ruta_clima
         self.ruta_papa = ruta_papa
+        self.df_clima = df_clima
+        self.df_papa = df_papa
         self.logger = logging.getLogger(__name__)
 
+    @classmethod
+    def from_dataframes(cls, df_clima: pd.DataFrame, df_papa: pd.DataFrame) -> "MergeDatosPapaAtmosfericos":
+        """
+        Crea el fusionador a partir de DataFrames ya cargados en memoria.
+
+        Args:
+            df_clima (pd.DataFrame): DataFrame de datos climáticos
+            df_papa (pd.DataFrame): DataFrame de datos de papa
+
+        Returns:
+            MergeDatosPapaAtmosfericos: Fusionador que no lee archivos
+        """
+        return cls(df_clima=df_clima, df_papa=df_papa)
+
     def _traducir_mes(self, mes: str) -> str:
         """
         Traduce nombres de meses del inglés al español.
@@ -51,6 +73,18 @@ class MergeDatosPapaAtmosfericos:
         }
         return mapa_meses.get(mes.upper(), mes.lower())
 
+    def _normalizar_canton(self, canton: str) -> str:
+        """
+        Normaliza el nombre de un cantón para la unión.
+
+        Args:
+            canton (str): Nombre del cantón
+
+        Returns:
+            str: Nombre sin espacios extremos y en mayúsculas
+        """
+        return str(canton).strip().upper()
+
     def _cargar_y_validar_datos(self) -> tuple[pd.DataFrame, pd.DataFrame]:
         """
         Carga y valida los datasets.
@@ -62,9 +96,16 @@ class MergeDatosPapaAtmosfericos:
             ValueError: Si hay problemas con los datos
         """
         try:
-            # Cargar datos
-            df_clima = pd.read_csv(self.ruta_clima, encoding='utf-8')
-            df_papa = pd.read_csv(self.ruta_papa, encoding='utf-8')
+            # Cargar datos (copia superficial si vienen en memoria, para no modificar los originales)
+            if self.df_clima is not None:
+                df_clima = self.df_clima.copy(deep=False)
+            else:
+                df_clima = pd.read_csv(self.ruta_clima, encoding='utf-8')
+
+            if self.df_papa is not None:
+                df_papa = self.df_papa.copy(deep=False)
+            else:
+                df_papa = pd.read_csv(self.ruta_papa, encoding='utf-8')
 
             # Validar que no estén vacíos
             if df_clima.empty:
@@ -89,12 +130,12 @@ class MergeDatosPapaAtmosfericos:
             if papa_faltantes:
                 raise ValueError(f"Columnas faltantes en datos de papa: {papa_faltantes}")
 
-            self.logger.info(f"Datos cargados - Clima: {len(df_clima)} filas, Papa: {len(df_papa)} filas")
+            self.logger.info("Datos cargados - Clima: %s filas, Papa: %s filas", len(df_clima), len(df_papa))
 
             return df_clima, df_papa
 
         except Exception as e:
-            self.logger.error(f"Error cargando datos: {e}")
+            self.logger.error("Error cargando datos: %s", e)
             raise
 
     def unir_datasets(self) -> pd.DataFrame:
@@ -110,23 +151,28 @@ class MergeDatosPapaAtmosfericos:
         try:
             df_clima, df_papa = self._cargar_y_validar_datos()
 
-            # Procesar datos climáticos
-            df_clima["mes"] = df_clima["mes"].apply(self._traducir_mes)
-            df_clima["canton"] = df_clima["canton"].str.strip().str.upper()
+            # Procesar datos climáticos; en columnas categóricas map solo transforma las
+            # categorías, así que las claves siguen siendo categóricas hasta la unión
+            df_clima["mes"] = df_clima["mes"].map(self._traducir_mes, na_action='ignore')
+            df_clima["canton"] = df_clima["canton"].map(self._normalizar_canton, na_action='ignore')
             df_clima["anio"] = pd.to_numeric(df_clima["anio"], errors='coerce')
 
             # Procesar datos de papa
-            df_papa["canton"] = df_papa["canton"].str.strip().str.upper()
+            df_papa["canton"] = df_papa["canton"].map(self._normalizar_canton, na_action='ignore')
             df_papa["anio"] = pd.to_numeric(df_papa["anio"], errors='coerce')
 
             # Eliminar filas con valores nulos en las columnas clave
             df_clima = df_clima.dropna(subset=["anio", "mes", "canton"])
             df_papa = df_papa.dropna(subset=["anio", "mes", "canton"])
 
-            # Realizar el merge
-            df_fusionado = pd.merge(df_papa, df_clima,
-                                    on=["anio", "mes", "canton"],
-                                    how="left")
+            # Indexar por las claves de unión; el índice de clima se ordena una sola vez
+            claves = ["canton", "mes", "anio"]
+            df_clima = df_clima.set_index(claves).sort_index()
+
+            # Realizar el merge, validando que el clima sea único por clave
+            df_fusionado = df_papa.set_index(claves).join(df_clima,
+                                                          how="left",
+                                                          validate="many_to_one").reset_index()
 
             # Validar resultado
             if df_fusionado.empty:
@@ -135,15 +181,15 @@ class MergeDatosPapaAtmosfericos:
             # Estadísticas del merge
             filas_originales = len(df_papa)
             filas_fusionadas = len(df_fusionado)
-            filas_con_clima = len(df_fusionado.dropna(subset=df_clima.columns.difference(["anio", "mes", "canton"])))
+            filas_con_clima = len(df_fusionado.dropna(subset=df_clima.columns))
 
-            self.logger.info(f"Fusión completada:")
-            self.logger.info(f"  - Filas originales: {filas_originales}")
-            self.logger.info(f"  - Filas fusionadas: {filas_fusionadas}")
-            self.logger.info(f"  - Filas con datos climáticos: {filas_con_clima}")
+            self.logger.info("Fusión completada:")
+            self.logger.info("  - Filas originales: %s", filas_originales)
+            self.logger.info("  - Filas fusionadas: %s", filas_fusionadas)
+            self.logger.info("  - Filas con datos climáticos: %s", filas_con_clima)
 
             return df_fusionado
 
         except Exception as e:
-            self.logger.error(f"Error en la fusión de datos: {e}")
+            self.logger.error("Error en la fusión de datos: %s", e)
             raise
\ No newline at end of file
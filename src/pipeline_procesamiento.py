@@ -3,7 +3,10 @@ Pipeline centralizado para el procesamiento completo de datos.
 """
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import os
+import time
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
@@ -13,6 +16,32 @@ from src.procesador_datos_atmosfericos import ProcesadorDatosAtmosfericos
 from src.merge_datos_papa_atmosfericos import MergeDatosPapaAtmosfericos
 
 
+# Nombre del archivo de log, fijado una vez al importar el módulo
+_ARCHIVO_LOG = f'logs/pipeline_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+
+
+def _init_logging(log_level: str) -> None:
+    """
+    Configura el sistema de logging; los handlers se crean una sola vez por proceso.
+
+    Args:
+        log_level (str): Nivel de logging
+    """
+    if not logging.getLogger().handlers:
+        # Crear carpeta logs si no existe
+        os.makedirs("logs", exist_ok=True)
+
+        logging.basicConfig(
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            handlers=[
+                logging.StreamHandler(),
+                logging.FileHandler(_ARCHIVO_LOG)
+            ]
+        )
+
+    logging.getLogger().setLevel(getattr(logging, log_level.upper()))
+
+
 class PipelineProcesamiento:
     """
     Pipeline centralizado para procesar datos de papa y clima.
@@ -35,9 +64,10 @@ class PipelineProcesamiento:
         self.ruta_excel_papa = ruta_excel_papa
         self.carpeta_datos_atmosfericos = carpeta_datos_atmosfericos
         self.carpeta_salida = carpeta_salida
+        self.procesador_atmosferico = None
 
         # Configurar logging
-        self._configurar_logging(log_level)
+        _init_logging(log_level)
         self.logger = logging.getLogger(__name__)
 
         # Crear carpeta de salida si no existe
@@ -45,25 +75,6 @@ class PipelineProcesamiento:
 
         self.logger.info("Pipeline inicializado correctamente")
 
-    def _configurar_logging(self, log_level: str) -> None:
-        """
-        Configura el sistema de logging.
-
-        Args:
-            log_level (str): Nivel de logging
-        """
-        # Crear carpeta logs si no existe
-        os.makedirs("logs", exist_ok=True)
-
-        logging.basicConfig(
-            level=getattr(logging, log_level.upper()),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.StreamHandler(),
-                logging.FileHandler(f'logs/pipeline_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
-            ]
-        )
-
     def _validar_archivos_entrada(self) -> None:
         """
         Valida que existan los archivos y carpetas de entrada.
@@ -80,9 +91,12 @@ class PipelineProcesamiento:
         if not os.path.isdir(self.carpeta_datos_atmosfericos):
             raise NotADirectoryError(f"La ruta no es una carpeta válida: {self.carpeta_datos_atmosfericos}")
 
-        # Verificar que hay archivos CSV en la carpeta
-        archivos_csv = [f for f in os.listdir(self.carpeta_datos_atmosfericos) if f.endswith('.csv')]
-        if not archivos_csv:
+        # Verificar que hay archivos CSV en la carpeta; el procesador reutiliza este listado
+        self.procesador_atmosferico = ProcesadorDatosAtmosfericos(
+            self.carpeta_datos_atmosfericos,
+            self.carpeta_salida
+        )
+        if not self.procesador_atmosferico.archivos_csv:
             raise FileNotFoundError(f"No se encontraron archivos CSV en: {self.carpeta_datos_atmosfericos}")
 
         self.logger.info("Validación de archivos de entrada completada")
@@ -104,7 +118,7 @@ class PipelineProcesamiento:
             return df_papa
 
         except Exception as e:
-            self.logger.error(f"Error procesando datos de papa: {e}")
+            self.logger.error("Error procesando datos de papa: %s", e)
             raise
 
     def procesar_datos_atmosfericos(self) -> pd.DataFrame:
@@ -117,18 +131,19 @@ class PipelineProcesamiento:
         try:
             self.logger.info("Iniciando procesamiento de datos atmosféricos")
 
-            procesador_atmosferico = ProcesadorDatosAtmosfericos(
-                self.carpeta_datos_atmosfericos,
-                self.carpeta_salida
-            )
+            if self.procesador_atmosferico is None:
+                self.procesador_atmosferico = ProcesadorDatosAtmosfericos(
+                    self.carpeta_datos_atmosfericos,
+                    self.carpeta_salida
+                )
 
-            df_clima = procesador_atmosferico.procesar_todos()
+            df_clima = self.procesador_atmosferico.procesar_todos()
 
             self.logger.info("Procesamiento de datos atmosféricos completado")
             return df_clima
 
         except Exception as e:
-            self.logger.error(f"Error procesando datos atmosféricos: {e}")
+            self.logger.error("Error procesando datos atmosféricos: %s", e)
             raise
 
     def fusionar_datos(self, df_papa: pd.DataFrame, df_clima: pd.DataFrame) -> pd.DataFrame:
@@ -145,45 +160,97 @@ class PipelineProcesamiento:
         try:
             self.logger.info("Iniciando fusión de datos")
 
-            # Crear archivos temporales para el merge
-            import tempfile
-
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as tmp_clima:
-                df_clima.to_csv(tmp_clima.name, index=False, encoding='utf-8')
-                ruta_tmp_clima = tmp_clima.name
-
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as tmp_papa:
-                df_papa.to_csv(tmp_papa.name, index=False, encoding='utf-8')
-                ruta_tmp_papa = tmp_papa.name
-
-            # Realizar la fusión
-            fusionador = MergeDatosPapaAtmosfericos(ruta_tmp_clima, ruta_tmp_papa)
+            # Realizar la fusión directamente sobre los DataFrames
+            fusionador = MergeDatosPapaAtmosfericos.from_dataframes(df_clima, df_papa)
             df_fusionado = fusionador.unir_datasets()
 
-            # Limpiar archivos temporales
-            os.unlink(ruta_tmp_clima)
-            os.unlink(ruta_tmp_papa)
-
             self.logger.info("Fusión completada")
             return df_fusionado
 
         except Exception as e:
-            self.logger.error(f"Error fusionando datos: {e}")
+            self.logger.error("Error fusionando datos: %s", e)
             raise
 
 
-    def ejecutar_pipeline_completo(self) -> tuple[str, Dict[str, Any]]:
+    def generar_reporte_calidad(self, df_final: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Genera un reporte de calidad del dataset final.
+
+        Args:
+            df_final (pd.DataFrame): DataFrame fusionado
+
+        Returns:
+            Dict[str, Any]: Métricas de calidad del dataset
+        """
+        # Contar nulos en una sola pasada y reutilizar el total
+        total_faltantes = int(df_final.isnull().to_numpy().sum())
+        filas, columnas = df_final.shape
+        total_celdas = filas * columnas
+
+        reporte = {
+            "total_registros": filas,
+            "total_columnas": columnas,
+            "valores_faltantes": total_faltantes,
+            "porcentaje_completitud": round((1 - total_faltantes / total_celdas) * 100, 2) if total_celdas else 0.0,
+            "cantones_unicos": len(pd.unique(df_final["canton"].to_numpy())),
+            "anios_unicos": len(pd.unique(df_final["anio"].to_numpy())),
+            "meses_unicos": len(pd.unique(df_final["mes"].to_numpy()))
+        }
+
+        self.logger.info("Reporte de calidad generado: %s", reporte)
+        return reporte
+
+    def _guardar_resultado(self, df_final: pd.DataFrame, formato: str) -> str:
+        """
+        Guarda el dataset final en la carpeta de salida.
+
+        El CSV de PyArrow escribe los flotantes enteros sin ".0" (-999 en lugar
+        de -999.0), por lo que al releerlo con pd.read_csv una columna cuyos
+        valores sean todos enteros (por ejemplo IMERG_PRECTOT) se infiere como
+        int64. Usar formato "parquet" si se necesitan los tipos exactos.
+
+        Args:
+            df_final (pd.DataFrame): DataFrame fusionado
+            formato (str): Formato de salida ("csv" o "parquet")
+
+        Returns:
+            str: Ruta del archivo guardado
+        """
+        ruta_final = os.path.join(self.carpeta_salida, f"rnn_df.{formato}")
+
+        if formato == "parquet":
+            df_final.to_parquet(ruta_final, engine="pyarrow", compression="zstd", index=False)
+        else:
+            # Escritura con PyArrow, mucho más rápida que DataFrame.to_csv; cantones y
+            # meses nunca contienen comas ni comillas, así que no se citan. PyArrow cita
+            # siempre el encabezado, por eso se escribe aparte
+            tabla = pa.Table.from_pandas(df_final, preserve_index=False)
+            opciones = pa_csv.WriteOptions(include_header=False, quoting_style="none")
+            with open(ruta_final, "wb") as f:
+                f.write((",".join(map(str, df_final.columns)) + "\n").encode("utf-8"))
+                pa_csv.write_csv(tabla, f, write_options=opciones)
+
+        return ruta_final
+
+    def ejecutar_pipeline_completo(self, formato: str = "csv") -> tuple[str, Dict[str, Any]]:
         """
         Ejecuta todo el pipeline de procesamiento.
 
+        Args:
+            formato (str): Formato del archivo final ("csv" o "parquet")
+
         Returns:
             tuple: (ruta_archivo_final, reporte_calidad)
 
         Raises:
+            ValueError: Si el formato de salida no es válido
             Exception: Si hay errores en cualquier paso del pipeline
         """
+        if formato not in ("csv", "parquet"):
+            raise ValueError(f"Formato de salida no soportado: {formato}")
+
         try:
-            inicio = datetime.now()
+            inicio = time.perf_counter_ns()
             self.logger.info("=== INICIANDO PIPELINE COMPLETO ===")
 
             # Validar archivos de entrada
@@ -199,19 +266,20 @@ class PipelineProcesamiento:
             df_final = self.fusionar_datos(df_papa, df_clima)
 
             # Guardar resultado final
-            ruta_final = os.path.join(self.carpeta_salida, "rnn_df.csv")
-            df_final.to_csv(ruta_final, index=False, encoding='utf-8')
+            ruta_final = self._guardar_resultado(df_final, formato)
 
+            # Generar reporte de calidad
+            reporte = self.generar_reporte_calidad(df_final)
 
-            # Calcular tiempo total
-            tiempo_total = datetime.now() - inicio
+            # Calcular tiempo total con un reloj monotónico
+            tiempo_total_ms = (time.perf_counter_ns() - inicio) / 1e6
 
-            self.logger.info(f"=== PIPELINE COMPLETADO EXITOSAMENTE ===")
-            self.logger.info(f"Tiempo total: {tiempo_total}")
-            self.logger.info(f"Archivo final: {ruta_final}")
+            self.logger.info("=== PIPELINE COMPLETADO EXITOSAMENTE ===")
+            self.logger.info("Tiempo total: %.2f ms", tiempo_total_ms)
+            self.logger.info("Archivo final: %s", ruta_final)
 
-            return ruta_final
+            return ruta_final, reporte
 
         except Exception as e:
-            self.logger.error(f"Error en pipeline completo: {e}")
+            self.logger.error("Error en pipeline completo: %s", e)
             raise
@@ -3,10 +3,26 @@ Clase para limpiar y transformar datos atmosféricos.
 Procesa múltiples archivos CSV con datos climatológicos por cantón.
 """
 
+import numpy as np
 import pandas as pd
 import os
-from typing import List, Optional
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from pandas.api.types import union_categoricals
+from typing import List, Optional, Tuple
 import logging
+import logging.handlers
+
+
+MESES = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN",
+         "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+TIPOS_COLUMNAS = {"PARAMETER": "category", "YEAR": "int16",
+                  **{mes: "float32" for mes in MESES}}
+
+# Archivos mayores a este tamaño (bytes) se leen por bloques de FILAS_POR_BLOQUE filas
+UMBRAL_LECTURA_POR_BLOQUES = 50 << 20
+FILAS_POR_BLOQUE = 100_000
 
 
 class ProcesadorDatosAtmosfericos:
@@ -35,6 +51,100 @@ class ProcesadorDatosAtmosfericos:
         self.carpeta_salida = carpeta_salida
         self.logger = logging.getLogger(__name__)
 
+        # Listar los CSV una sola vez para validación y procesamiento
+        with os.scandir(carpeta) as entradas:
+            self.archivos_csv = [e.path for e in entradas if e.is_file() and e.name.endswith(".csv")]
+
+    def _validar_columnas(self, df: pd.DataFrame, ruta: str) -> bool:
+        """
+        Verifica que la tabla tenga las columnas PARAMETER, YEAR y los meses.
+
+        Args:
+            df (pd.DataFrame): Tabla leída del archivo
+            ruta (str): Ruta del archivo de origen (para los mensajes de log)
+
+        Returns:
+            bool: True si no falta ninguna columna
+        """
+        columnas_necesarias = ["PARAMETER", "YEAR"] + MESES
+
+        columnas_faltantes = [col for col in columnas_necesarias if col not in df.columns]
+        if columnas_faltantes:
+            self.logger.warning("Columnas faltantes en %s: %s", ruta, columnas_faltantes)
+            return False
+
+        return True
+
+    def _pivotear_parametros(self, df: pd.DataFrame, ruta: str) -> Optional[pd.DataFrame]:
+        """
+        Reorganiza la tabla leída a una fila por año y mes, con una columna por parámetro.
+
+        Args:
+            df (pd.DataFrame): Tabla con columnas PARAMETER, YEAR y los meses
+            ruta (str): Ruta del archivo de origen (para los mensajes de log)
+
+        Returns:
+            pd.DataFrame: DataFrame reorganizado o None si la tabla no es válida
+        """
+        if df.empty:
+            self.logger.warning("El archivo %s está vacío después del procesamiento", ruta)
+            return None
+
+        if not self._validar_columnas(df, ruta):
+            return None
+
+        # Una fila por año y mes, una columna por parámetro
+        anios = np.sort(df["YEAR"].unique())
+        columnas = {"anio": np.repeat(anios, len(MESES)),
+                    "mes": pd.Categorical(np.tile(MESES, len(anios)), categories=MESES, ordered=True)}
+
+        for parametro in sorted(df["PARAMETER"].unique()):
+            df_parametro = df.loc[df["PARAMETER"] == parametro, ["YEAR"] + MESES]
+            if df_parametro["YEAR"].duplicated().any():
+                df_parametro = df_parametro.groupby("YEAR", as_index=False).mean()
+
+            valores = np.full((len(anios), len(MESES)), np.nan, dtype=np.float32)
+            filas = np.searchsorted(anios, df_parametro["YEAR"].to_numpy())
+            valores[filas] = df_parametro[MESES].to_numpy(dtype=np.float32)
+            columnas[parametro] = valores.ravel()
+
+        return pd.DataFrame(columnas)
+
+    def _leer_por_bloques(self, ruta: str, indice_inicio: int) -> Optional[pd.DataFrame]:
+        """
+        Lee un archivo grande por bloques, acumulando sumas y conteos por parámetro y año.
+
+        Args:
+            ruta (str): Ruta del archivo CSV
+            indice_inicio (int): Línea donde empieza la tabla de datos
+
+        Returns:
+            pd.DataFrame: DataFrame reorganizado o None si hay error
+        """
+        sumas = []
+        conteos = []
+        with pd.read_csv(ruta, skiprows=indice_inicio, dtype=TIPOS_COLUMNAS,
+                         engine="c", chunksize=FILAS_POR_BLOQUE) as lector:
+            for bloque in lector:
+                if not self._validar_columnas(bloque, ruta):
+                    return None
+
+                grupos = bloque.groupby(["PARAMETER", "YEAR"], observed=True)[MESES]
+                sumas.append(grupos.sum())
+                conteos.append(grupos.count())
+
+        if not sumas:
+            self.logger.warning("El archivo %s está vacío después del procesamiento", ruta)
+            return None
+
+        # Un (PARAMETER, YEAR) duplicado puede quedar repartido entre bloques: sumar sumas
+        # y conteos da la misma media que una lectura completa
+        suma = pd.concat(sumas).groupby(level=["PARAMETER", "YEAR"], observed=True).sum()
+        conteo = pd.concat(conteos).groupby(level=["PARAMETER", "YEAR"], observed=True).sum()
+        df = (suma / conteo).astype(np.float32).reset_index()
+
+        return self._pivotear_parametros(df, ruta)
+
     def _leer_archivo(self, ruta: str, canton: str) -> Optional[pd.DataFrame]:
         """
         Lee y procesa un archivo CSV individual.
@@ -47,61 +157,68 @@ class ProcesadorDatosAtmosfericos:
             pd.DataFrame: DataFrame procesado o None si hay error
         """
         try:
-            # Leer archivo buscando el encabezado correcto
+            # Encontrar dónde empieza la tabla de datos, leyendo solo hasta el encabezado
             with open(ruta, 'r', encoding='utf-8') as f:
-                lineas = f.readlines()
-
-            # Encontrar dónde empieza la tabla de datos
-            indice_inicio = None
-            for i, linea in enumerate(lineas):
-                if linea.strip().startswith("PARAMETER,YEAR"):
-                    indice_inicio = i
-                    break
+                indice_inicio = next((i for i, linea in enumerate(f)
+                                      if linea.strip().startswith("PARAMETER,YEAR")), None)
 
             if indice_inicio is None:
-                self.logger.warning(f"No se encontró encabezado válido en {ruta}")
+                self.logger.warning("No se encontró encabezado válido en %s", ruta)
                 return None
 
-            # Leer desde ese punto como CSV
-            df = pd.read_csv(ruta, skiprows=indice_inicio)
+            # Leer desde ese punto como CSV con tipos declarados; por bloques si es muy grande
+            if os.path.getsize(ruta) > UMBRAL_LECTURA_POR_BLOQUES:
+                df_pivoteado = self._leer_por_bloques(ruta, indice_inicio)
+            else:
+                # Con el motor pyarrow la línea del encabezado se indica con header, no skiprows
+                df = pd.read_csv(ruta, header=indice_inicio, dtype=TIPOS_COLUMNAS, engine="pyarrow")
+                df_pivoteado = self._pivotear_parametros(df, ruta)
 
-            if df.empty:
-                self.logger.warning(f"El archivo {ruta} está vacío después del procesamiento")
+            if df_pivoteado is None:
                 return None
 
-            # Verificar columnas necesarias
-            columnas_necesarias = ["PARAMETER", "YEAR", "JAN", "FEB", "MAR", "APR",
-                                 "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+            # Agregar nombre del cantón como categoría (un código por fila, no un string)
+            df_pivoteado["canton"] = pd.Categorical.from_codes(np.zeros(len(df_pivoteado), dtype=np.int8),
+                                                               categories=[canton.strip().upper()])
 
-            columnas_faltantes = [col for col in columnas_necesarias if col not in df.columns]
-            if columnas_faltantes:
-                self.logger.warning(f"Columnas faltantes en {ruta}: {columnas_faltantes}")
-                return None
+            return df_pivoteado
 
-            # Reorganizar a formato largo
-            df_largo = df.melt(id_vars=["PARAMETER", "YEAR"],
-                             value_vars=["JAN", "FEB", "MAR", "APR", "MAY", "JUN",
-                                       "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"],
-                             var_name="mes", value_name="valor")
+        except Exception as e:
+            self.logger.error("Error procesando archivo %s: %s", ruta, e)
+            return None
 
-            # Convertir valores a numérico
-            df_largo["valor"] = pd.to_numeric(df_largo["valor"], errors='coerce')
+    def _leer_archivo_en_proceso(self, ruta: str, canton: str) -> Tuple[Optional[pd.DataFrame], List[logging.LogRecord]]:
+        """
+        Ejecuta _leer_archivo en un proceso hijo y devuelve también sus mensajes de log.
 
-            # Pivotear para tener una fila por año, mes y todas las variables
-            df_pivoteado = df_largo.pivot_table(index=["YEAR", "mes"],
-                                              columns="PARAMETER",
-                                              values="valor",
-                                              aggfunc='mean').reset_index()
+        Con el método spawn (Windows/macOS) los procesos hijos no tienen los handlers
+        del pipeline, así que los mensajes se capturan aquí y se reemiten en el padre.
 
-            # Agregar nombre del cantón y renombrar columnas
-            df_pivoteado["canton"] = canton.strip().upper()
-            df_pivoteado = df_pivoteado.rename(columns={"YEAR": "anio"})
+        Args:
+            ruta (str): Ruta del archivo CSV
+            canton (str): Nombre del cantón
 
-            return df_pivoteado
+        Returns:
+            tuple: (DataFrame procesado o None, registros de log capturados)
+        """
+        cola = queue.SimpleQueue()
+        handler = logging.handlers.QueueHandler(cola)
+        propagar = self.logger.propagate
 
-        except Exception as e:
-            self.logger.error(f"Error procesando archivo {ruta}: {e}")
-            return None
+        # Sin propagar, para no duplicar los mensajes cuando el hijo hereda handlers (fork)
+        self.logger.addHandler(handler)
+        self.logger.propagate = False
+        try:
+            df = self._leer_archivo(ruta, canton)
+        finally:
+            self.logger.removeHandler(handler)
+            self.logger.propagate = propagar
+
+        registros = []
+        while not cola.empty():
+            registros.append(cola.get())
+
+        return df, registros
 
     def procesar_todos(self, nombre_archivo: str = None) -> pd.DataFrame:
         """
@@ -117,32 +234,40 @@ class ProcesadorDatosAtmosfericos:
             ValueError: Si no se pueden procesar archivos
         """
         try:
-            archivos = [f for f in os.listdir(self.carpeta) if f.endswith(".csv")]
+            archivos = self.archivos_csv
 
             if not archivos:
                 raise ValueError(f"No se encontraron archivos CSV en {self.carpeta}")
 
-            self.logger.info(f"Procesando {len(archivos)} archivos CSV")
+            self.logger.info("Procesando %s archivos CSV", len(archivos))
+
+            cantones = [os.path.splitext(os.path.basename(ruta))[0] for ruta in archivos]
 
-            df_final = []
-            archivos_procesados = 0
+            # Cada archivo es independiente, se procesan en paralelo
+            max_workers = min(len(archivos), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                resultados = list(executor.map(self._leer_archivo_en_proceso, archivos, cantones))
 
-            for archivo in archivos:
-                ruta = os.path.join(self.carpeta, archivo)
-                canton = os.path.splitext(archivo)[0]
+            # Reemitir en el proceso principal los mensajes de cada archivo
+            for _, registros in resultados:
+                for registro in registros:
+                    self.logger.handle(registro)
 
-                df_canton = self._leer_archivo(ruta, canton)
-                if df_canton is not None:
-                    df_final.append(df_canton)
-                    archivos_procesados += 1
+            df_final = [df_canton for df_canton, _ in resultados if df_canton is not None]
+            archivos_procesados = len(df_final)
 
             if not df_final:
                 raise ValueError("No se pudo procesar ningún archivo CSV válido")
 
-            self.logger.info(f"Se procesaron exitosamente {archivos_procesados} de {len(archivos)} archivos")
+            self.logger.info("Se procesaron exitosamente %s de %s archivos", archivos_procesados, len(archivos))
+
+            # Unificar las categorías de cantón para que la concatenación las conserve
+            cantones = union_categoricals([df["canton"] for df in df_final]).categories
+            for df in df_final:
+                df["canton"] = df["canton"].cat.set_categories(cantones)
 
             # Consolidar todos los DataFrames
-            df_consolidado = pd.concat(df_final, ignore_index=True)
+            df_consolidado = pd.concat(df_final, ignore_index=True, copy=False)
 
             # Solo guardar si se especifica nombre de archivo
             if nombre_archivo:
@@ -153,11 +278,11 @@ class ProcesadorDatosAtmosfericos:
                 ruta_salida = os.path.join(self.carpeta_salida, nombre_archivo)
                 df_consolidado.to_csv(ruta_salida, index=False, encoding='utf-8')
 
-                self.logger.info(f"Datos consolidados guardados en: {ruta_salida}")
+                self.logger.info("Datos consolidados guardados en: %s", ruta_salida)
 
             return df_consolidado
 
         except Exception as e:
-            self.logger.error(f"Error al procesar archivos: {e}")
+            self.logger.error("Error al procesar archivos: %s", e)
             raise
 
@@ -3,9 +3,11 @@ Clase para limpiar y transformar datos de producción de papa.
 Procesa archivos Excel con datos de producción y área sembrada por cantón, año y mes.
 """
 
+import numpy as np
 import pandas as pd
 import os
-from typing import List, Optional
+import shutil
+from typing import Dict, List, Optional, Tuple
 import logging
 
 
@@ -32,12 +34,163 @@ class ProcesadorDatosPapa:
             raise ValueError(f"El archivo debe ser Excel (.xls o .xlsx), recibido: {archivo_excel}")
 
         self.archivo = archivo_excel
+        self.carpeta_cache = f"{archivo_excel}.cache"
         self.nombres_interes = ['Turrialba', 'Oreamuno', 'El Guarco', 'Cartago', 'Alvarado']
         self.meses = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
                       'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
         self.df_largo = None
         self.logger = logging.getLogger(__name__)
 
+    def _cache_vigente(self) -> bool:
+        """
+        Indica si la caché Parquet existe y es más reciente que el archivo Excel.
+
+        Returns:
+            bool: True si la caché puede usarse en lugar del Excel
+        """
+        return (os.path.isdir(self.carpeta_cache) and
+                os.path.getmtime(self.carpeta_cache) >= os.path.getmtime(self.archivo))
+
+    def _normalizar_hoja(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Normaliza los tipos de una hoja para poder guardarla en Parquet.
+
+        Las columnas de datos se convierten a numérico (igual que en el
+        procesamiento posterior) y la columna de cantones a texto.
+
+        Args:
+            df (pd.DataFrame): Hoja leída del Excel
+
+        Returns:
+            pd.DataFrame: Hoja con tipos homogéneos por columna
+        """
+        df.columns = df.columns.astype(str)
+        if len(df.columns) > 0:
+            df[df.columns[0]] = df[df.columns[0]].astype("string")
+        for columna in df.columns[1:]:
+            df[columna] = pd.to_numeric(df[columna], errors='coerce')
+        return df
+
+    def _guardar_cache(self, hojas: Dict[str, pd.DataFrame]) -> None:
+        """
+        Guarda cada hoja como un archivo Parquet dentro de la carpeta de caché.
+
+        Args:
+            hojas (Dict[str, pd.DataFrame]): Hojas normalizadas por nombre
+        """
+        carpeta_tmp = f"{self.carpeta_cache}.tmp"
+        shutil.rmtree(carpeta_tmp, ignore_errors=True)
+        os.makedirs(carpeta_tmp)
+
+        # El prefijo numérico conserva el orden original de las hojas
+        for i, (hoja, df) in enumerate(hojas.items()):
+            ruta = os.path.join(carpeta_tmp, f"{i:03d}_{hoja}.parquet")
+            df.to_parquet(ruta, engine="pyarrow", compression="zstd", index=False)
+
+        shutil.rmtree(self.carpeta_cache, ignore_errors=True)
+        os.replace(carpeta_tmp, self.carpeta_cache)
+
+    def _leer_cache(self) -> Dict[str, pd.DataFrame]:
+        """
+        Lee las hojas guardadas en la carpeta de caché.
+
+        Returns:
+            Dict[str, pd.DataFrame]: Hojas del archivo indexadas por nombre
+
+        Raises:
+            ValueError: Si la caché no contiene hojas
+        """
+        hojas = {}
+        for archivo in sorted(os.listdir(self.carpeta_cache)):
+            # Ignorar cualquier archivo ajeno a la caché
+            if not archivo.endswith(".parquet"):
+                continue
+
+            hoja = os.path.splitext(archivo)[0].split("_", 1)[1]
+            ruta = os.path.join(self.carpeta_cache, archivo)
+            hojas[hoja] = pd.read_parquet(ruta, engine="pyarrow")
+
+        if not hojas:
+            raise ValueError(f"La caché {self.carpeta_cache} no contiene hojas")
+
+        return hojas
+
+    def _leer_excel(self) -> Tuple[Dict[str, pd.DataFrame], bool]:
+        """
+        Lee y normaliza cada hoja del Excel, omitiendo las que fallen.
+
+        Returns:
+            tuple: (hojas indexadas por nombre, True si todas las hojas se leyeron)
+        """
+        hojas = {}
+        completo = True
+
+        # Abrir el libro una sola vez y leer cada hoja con encabezado en fila 6 (index=5)
+        with pd.ExcelFile(self.archivo) as xls:
+            for hoja in xls.sheet_names:
+                try:
+                    hojas[hoja] = self._normalizar_hoja(xls.parse(hoja, header=5))
+                except Exception as e:
+                    self.logger.error("Error procesando hoja %s: %s", hoja, e)
+                    completo = False
+
+        return hojas, completo
+
+    def _leer_hojas(self) -> Dict[str, pd.DataFrame]:
+        """
+        Lee todas las hojas del Excel, usando la caché Parquet si está vigente.
+
+        Returns:
+            Dict[str, pd.DataFrame]: Hojas del archivo indexadas por nombre
+        """
+        if self._cache_vigente():
+            try:
+                hojas = self._leer_cache()
+                self.logger.info("Hojas cargadas desde caché: %s", self.carpeta_cache)
+                return hojas
+            except Exception as e:
+                self.logger.warning("No se pudo leer la caché Parquet, se reconstruye desde el Excel: %s", e)
+
+        hojas, completo = self._leer_excel()
+
+        # Una caché parcial ocultaría las hojas fallidas hasta que cambie el Excel
+        if not completo:
+            self.logger.warning("No se guarda la caché Parquet porque alguna hoja falló")
+            shutil.rmtree(self.carpeta_cache, ignore_errors=True)
+            return hojas
+
+        try:
+            self._guardar_cache(hojas)
+            self.logger.info("Caché Parquet guardada en: %s", self.carpeta_cache)
+        except Exception as e:
+            self.logger.warning("No se pudo guardar la caché Parquet: %s", e)
+
+        return hojas
+
+    def _reducir_precision(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convierte el año a int16.
+
+        Producción y área se mantienen en float64: los valores del Excel
+        tienen más dígitos de los que float32 conserva.
+
+        Args:
+            df (pd.DataFrame): DataFrame en formato largo
+
+        Returns:
+            pd.DataFrame: DataFrame con el año reducido a int16
+
+        Raises:
+            ValueError: Si algún año no cabe en int16
+        """
+        if pd.api.types.is_integer_dtype(df["anio"]):
+            limites = np.iinfo(np.int16)
+            if df["anio"].min() < limites.min or df["anio"].max() > limites.max:
+                raise ValueError("Años fuera del rango de int16")
+            df["anio"] = df["anio"].astype("int16")
+
+        return df
+
     def procesar_a_formato_largo(self) -> pd.DataFrame:
         """
         Procesa el archivo Excel directamente al formato largo.
@@ -49,22 +202,18 @@ class ProcesadorDatosPapa:
             Exception: Si hay problemas al procesar el archivo
         """
         try:
-            xls = pd.ExcelFile(self.archivo)
-            hojas = xls.sheet_names
-            self.logger.info(f"Procesando {len(hojas)} hojas del archivo Excel")
+            hojas = self._leer_hojas()
+            self.logger.info("Procesando %s hojas del archivo Excel", len(hojas))
 
             if not hojas:
                 raise ValueError("El archivo Excel no contiene hojas válidas")
 
             datos = []
 
-            for hoja in hojas:
+            for hoja, df in hojas.items():
                 try:
-                    # Leer hoja con encabezado en fila 6 (index=5)
-                    df = pd.read_excel(self.archivo, sheet_name=hoja, header=5)
-
                     if df.empty:
-                        self.logger.warning(f"La hoja {hoja} está vacía, omitiendo...")
+                        self.logger.warning("La hoja %s está vacía, omitiendo...", hoja)
                         continue
 
                     # Nombre de la primera columna (cantones)
@@ -74,7 +223,7 @@ class ProcesadorDatosPapa:
                     df_filtrado = df[df[nombre_columna_a].isin(self.nombres_interes)].copy()
 
                     if df_filtrado.empty:
-                        self.logger.warning(f"No se encontraron cantones de interés en la hoja {hoja}")
+                        self.logger.warning("No se encontraron cantones de interés en la hoja %s", hoja)
                         continue
 
                     # Armar lista de nuevos nombres
@@ -85,46 +234,43 @@ class ProcesadorDatosPapa:
 
                     # Verificar que hay suficientes columnas
                     if len(df_filtrado.columns) < len(nuevos_nombres):
-                        self.logger.warning(f"La hoja {hoja} no tiene suficientes columnas, omitiendo...")
+                        self.logger.warning("La hoja %s no tiene suficientes columnas, omitiendo...", hoja)
                         continue
 
                     # Cortar el DataFrame para que solo tenga la cantidad correcta de columnas
                     df_filtrado = df_filtrado.iloc[:, :len(nuevos_nombres)]
                     df_filtrado.columns = nuevos_nombres
 
-                    # Transformar a formato largo
-                    for _, fila in df_filtrado.iterrows():
-                        for mes in self.meses:
-                            try:
-                                produccion = pd.to_numeric(fila[f'{mes}_produccion'], errors='coerce')
-                                area = pd.to_numeric(fila[f'{mes}_area'], errors='coerce')
-
-                                datos.append({
-                                    'canton': str(fila['canton']).strip(),
-                                    'mes': mes,
-                                    'anio': int(hoja) if str(hoja).isdigit() else hoja,
-                                    'produccion': produccion,
-                                    'area': area
-                                })
-                            except (ValueError, KeyError) as e:
-                                self.logger.warning(f"Error procesando datos de {hoja}, {mes}: {e}")
-                                continue
+                    # Transformar a formato largo: (filas, meses, [producción, área])
+                    valores = df_filtrado.iloc[:, 1:].to_numpy(dtype=np.float64)
+                    valores = valores.reshape(len(df_filtrado), len(self.meses), 2)
+
+                    datos.append(pd.DataFrame({
+                        'canton': np.repeat(df_filtrado['canton'].astype(str).str.strip().to_numpy(), len(self.meses)),
+                        'mes': np.tile(self.meses, len(df_filtrado)),
+                        'anio': int(hoja) if str(hoja).isdigit() else hoja,
+                        'produccion': valores[:, :, 0].ravel(),
+                        'area': valores[:, :, 1].ravel()
+                    }))
 
                 except Exception as e:
-                    self.logger.error(f"Error procesando hoja {hoja}: {e}")
+                    self.logger.error("Error procesando hoja %s: %s", hoja, e)
                     continue
 
             if not datos:
                 raise ValueError("No se pudieron procesar datos de ninguna hoja")
 
-            # Crear el DataFrame en formato largo
-            self.df_largo = pd.DataFrame(datos)
-            self.logger.info(f"Procesamiento completado: {len(self.df_largo)} registros")
+            # Crear el DataFrame en formato largo, con cantón y mes como categorías
+            df_largo = pd.concat(datos, ignore_index=True)
+            df_largo["canton"] = df_largo["canton"].astype("category")
+            df_largo["mes"] = pd.Categorical(df_largo["mes"], categories=self.meses, ordered=True)
+            self.df_largo = self._reducir_precision(df_largo)
+            self.logger.info("Procesamiento completado: %s registros", len(self.df_largo))
 
             return self.df_largo
 
         except Exception as e:
-            self.logger.error(f"Error al procesar archivo Excel: {e}")
+            self.logger.error("Error al procesar archivo Excel: %s", e)
             raise
 
     def procesar_y_exportar(self, ruta_csv: str = None) -> pd.DataFrame:
@@ -146,10 +292,10 @@ class ProcesadorDatosPapa:
                 os.makedirs(os.path.dirname(ruta_csv), exist_ok=True)
 
                 self.df_largo.to_csv(ruta_csv, index=False, encoding='utf-8')
-                self.logger.info(f"Archivo CSV guardado en: {ruta_csv}")
+                self.logger.info("Archivo CSV guardado en: %s", ruta_csv)
 
             except Exception as e:
-                self.logger.error(f"Error al exportar CSV: {e}")
+                self.logger.error("Error al exportar CSV: %s", e)
                 raise
 
         return df